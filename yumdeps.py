@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 """
 Find yum dependencies
 
@@ -16,9 +16,10 @@ with the yum package dependencies. Parsing the yum output was the simplest appro
 import sys
 import logging
 from argparse import ArgumentParser
+from collections import namedtuple
 
 # Keywords used to parse the package information file.
-# They are also used as indices in the package information dictionary.
+# They are also used as indices in the dictionary used to collect the package information.
 KEY_NAME = 'Name'
 KEY_ARCH = 'Arch'
 KEY_VERSION = 'Version'
@@ -26,6 +27,7 @@ KEY_RELEASE = 'Release'
 KEY_REPOSITORY = 'Repo'
 KEY_SUMMARY = 'Summary'
 KEY_INFO_LIST = [KEY_NAME, KEY_ARCH, KEY_VERSION, KEY_RELEASE, KEY_REPOSITORY, KEY_SUMMARY]
+KEY_INFO_SET = frozenset(KEY_INFO_LIST)
 
 # Keywords used to parse the dependency file
 KEY_PACKAGE = 'package:'
@@ -46,9 +48,30 @@ OUT_CSV = 'csv'
 OUT_WIKI = 'wiki'
 OUT_SUMMARY = OUT_TEXT + '|' + OUT_CSV + '|' + OUT_WIKI
 
+# CSV output header
+CSV_HEADER = 'Package,Version,Release,Architecture,Repository,Dependency,Provider,Version,Architecture,' \
+             'Repository,Internal,Summary'
+
 # Default input file name root
 DEFAULT_ROOT = 'pkg'
 
+# Package information stored for each package
+PkgInfo = namedtuple('PkgInfo', ['arch', 'version', 'release', 'repository', 'summary'])
+
+
+def has_internal_provider(pkg_map, providers):
+    """
+    Check whether at least one of the providers of a dependency is a package,
+    i.e. whether the dependency is internal.
+    :param pkg_map: package information dictionary (PkgDep.pkg)
+    :type pkg_map: dict
+    :param providers: dependency providers, as (name, version) tuples
+    :type providers: iterable
+    :return: True if there is an internal provider, False otherwise
+    :rtype: bool
+    """
+    return any(p_name in pkg_map for p_name, _ in providers)
+
 
 class PkgDep:
     """
@@ -60,7 +83,7 @@ class PkgDep:
     This is to ensure a unique key is used to access elements in both dictionaries.
 
     The "pkg" dictionary is used to store information about the package itself. Each dictionary
-    entry is a six element tuple containing the package name, architecture, version number (or string),
+    entry is a PkgInfo named tuple containing the package architecture, version number (or string),
     release number (or string), repository (e.g. gemini-production/7/x86_64) and summary.
     The summary will be truncated if it uses more than one line.
 
@@ -68,9 +91,9 @@ class PkgDep:
     entry is a dictionary indexed by the dependency name (e.g. cfitsio). The list will be empty if the
     package has no dependencies.
 
-    Each dependency entry will contain a list of providers, and each provider will be described
-    by a two element tuple containing the provider name and architecture. The provider name follows
-    the same naming convention as "pkg" and "dep" keys.
+    Each dependency entry will contain a list of providers (converted to a tuple once all the information
+    has been added), and each provider will be described by a two element tuple containing the provider
+    name and architecture. The provider name follows the same naming convention as "pkg" and "dep" keys.
 
     Packages listed in the "pkg" dictionary are considered "internal". Dependencies containing at
     least one provider listed in the "pkg" dictionary are also considered "internal".
@@ -79,6 +102,9 @@ class PkgDep:
     def __init__(self):
         self.pkg = {}
         self.dep = {}
+        self.sorted_pkg_names = ()
+        self._internal_deps = {}
+        self._sorted_deps = {}
 
     def add_package(self, pkg_name, arch, version, release, repository, summary):
         """
@@ -98,10 +124,11 @@ class PkgDep:
         :type summary: str
         :return: None
         """
-        logging.debug('add_package ' + pkg_name)
+        logging.debug('add_package %s', pkg_name)
         if pkg_name not in self.pkg:
-            self.pkg[pkg_name] = {KEY_ARCH: arch, KEY_VERSION: version, KEY_RELEASE: release,
-                                  KEY_REPOSITORY: repository, KEY_SUMMARY: summary}
+            # Architecture, release and repository strings are shared by many packages
+            self.pkg[pkg_name] = PkgInfo(sys.intern(arch), version, sys.intern(release),
+                                         sys.intern(repository), summary)
             self.dep[pkg_name] = {}
         else:
             logging.warning('package ' + pkg_name + ' already exists, ignored')
@@ -115,7 +142,7 @@ class PkgDep:
         :type dep_name: str
         :return: None
         """
-        logging.debug('add_dependency ' + pkg_name + ' ' + dep_name)
+        logging.debug('add_dependency %s %s', pkg_name, dep_name)
         if pkg_name in self.dep:
             if dep_name not in self.dep[pkg_name]:
                 self.dep[pkg_name].update({dep_name: []})
@@ -143,83 +170,99 @@ class PkgDep:
         if pkg_name in self.dep:
             if dep_name in self.dep[pkg_name]:
                 # r_name, r_repo = DepDict._extract_version_and_repo(version)
-                self.dep[pkg_name][dep_name].append((provider, version))
-                logging.debug('adding provider ' + provider)
+                self.add_provider_fast(pkg_name, dep_name, provider, version)
+                logging.debug('adding provider %s', provider)
             else:
                 raise ValueError('dependency ' + dep_name + ' for package ' + pkg_name + ' does not exist')
         else:
             raise ValueError('package ' + pkg_name + ' does not exist')
 
+    def add_dependency_fast(self, pkg_name, dep_name):
+        """
+        Add dependency for a given package, without the checks and messages in add_dependency.
+        Used when parsing the dependency file. Repeated dependencies are not reported (their
+        providers are added to the existing list).
+        :param pkg_name: package name
+        :type pkg_name: str
+        :param dep_name: dependency name
+        :type dep_name: str
+        :return: None
+        """
+        self.dep.setdefault(pkg_name, {}).setdefault(dep_name, [])
+
+    def add_provider_fast(self, pkg_name, dep_name, provider, version):
+        """
+        Add provider for a given package and dependency, without the checks and messages in
+        add_provider. Used when parsing the dependency file, where the dependency is always
+        added before its providers.
+        :param pkg_name: package name
+        :type pkg_name: str
+        :param dep_name: dependency name
+        :type dep_name: str
+        :param provider: provider name (package)
+        :type provider: str
+        :param version: provider version
+        :type version: str
+        :raise KeyError: if package or dependency are not found
+        :return: None
+        """
+        self.dep[pkg_name][dep_name].append((sys.intern(provider), sys.intern(version)))
+
     def get_arch(self, pkg_name):
         """
         Return the package architecture.
         The architecture could be UNDEFINED if it was not defined (unlikely).
         :param pkg_name: package name
         :type pkg_name: str
-        :raise ValueError: if package is not found
+        :raise KeyError: if package is not found
         :return: package architecture
         :rtype: str
         """
-        if pkg_name in self.pkg:
-            return self.pkg[pkg_name][KEY_ARCH]
-        else:
-            raise ValueError('package ' + pkg_name + ' does not exist')
+        return self.pkg[pkg_name].arch
 
     def get_version(self, pkg_name):
         """
         Return the package version (e.g. '2.5.1271')
         :param pkg_name: package name
         :type pkg_name: str
-        :raise ValueError: if package is not found
+        :raise KeyError: if package is not found
         :return: package version
         :rtype: str
         """
-        if pkg_name in self.pkg:
-            return self.pkg[pkg_name][KEY_VERSION]
-        else:
-            raise ValueError('package ' + pkg_name + ' does not exist')
+        return self.pkg[pkg_name].version
 
     def get_release(self, pkg_name):
         """
         Return the package release number (e.g. '6', '14.el7.gemini', etc.)
         :param pkg_name: package name
         :type pkg_name: str
-        :raise ValueError: if package is not found
+        :raise KeyError: if package is not found
         :return: package version
         :rtype: str
         """
-        if pkg_name in self.pkg:
-            return self.pkg[pkg_name][KEY_RELEASE]
-        else:
-            raise ValueError('package ' + pkg_name + ' does not exist')
+        return self.pkg[pkg_name].release
 
     def get_repository(self, pkg_name):
         """
         Return the package repository (e.g. 'gemini-production/7/x86_64')
         :param pkg_name: package name
         :type pkg_name: str
-        :raise ValueError: if package is not found
+        :raise KeyError: if package is not found
         :return: package version
         :rtype: str
         """
-        if pkg_name in self.pkg:
-            return self.pkg[pkg_name][KEY_REPOSITORY]
-        else:
-            raise ValueError('package ' + pkg_name + ' does not exist')
+        return self.pkg[pkg_name].repository
 
     def get_summary(self, pkg_name):
         """
         Return the package one line summary.
         :param pkg_name: package name
         :type pkg_name: str
-        :raise ValueError: if package is not found
+        :raise KeyError: if package is not found
         :return: package version
         :rtype: str
         """
-        if pkg_name in self.pkg:
-            return self.pkg[pkg_name][KEY_SUMMARY]
-        else:
-            raise ValueError('package ' + pkg_name + ' does not exist')
+        return self.pkg[pkg_name].summary
 
     def get_dependency_list(self, pkg_name):
         """
@@ -227,37 +270,46 @@ class PkgDep:
         The list can be empty if the package has no dependencies.
         :param pkg_name: package name
         :type pkg_name: str
-        :raise ValueError: if package is not found
+        :raise KeyError: if package is not found
         :return: dependency list
         :rtype: list
         """
-        if pkg_name in self.dep:
-            return sorted(self.dep[pkg_name])
-        else:
-            raise ValueError('package ' + pkg_name + ' does not exist')
+        return sorted(self.dep[pkg_name])
+
+    def get_effective_dependency_list(self, pkg_name, include_all):
+        """
+        Return the (sorted) list of dependencies for a given package, either all of them or
+        only the internal ones. It uses the information computed by finalize.
+        :param pkg_name: package name
+        :type pkg_name: str
+        :param include_all: include all dependencies?
+        :type include_all: bool
+        :raise KeyError: if package is not found
+        :return: dependency list
+        :rtype: list
+        """
+        d_list = self._sorted_deps[pkg_name]
+        if not include_all:
+            internal_deps = self._internal_deps[pkg_name]
+            d_list = [d for d in d_list if d in internal_deps]
+        return d_list
 
     def get_provider_list(self, pkg_name, dep_name):
         """
         Return the list of providers for a given package and dependency.
         There should be at least one provider for each dependency.
-        The providers are returned as a list of tuples; the first element of the tuple is the
-        provider name and the second one the provider version
+        The providers are returned as a tuple of tuples (a list before finalize is called); the first
+        element of each tuple is the provider name and the second one the provider version
         :param pkg_name: package name
         :type pkg_name: str
         :param dep_name: dependency name
         :type dep_name: str
         :param dep_name:
-        :raise ValueError: if package or dependency are not found
-        :return: list of providers (tuple)
-        :rtype: list
+        :raise KeyError: if package or dependency are not found
+        :return: providers (tuple)
+        :rtype: tuple
         """
-        if pkg_name in self.dep:
-            if dep_name in self.dep[pkg_name]:
-                return self.dep[pkg_name][dep_name]
-            else:
-                raise ValueError('package ' + pkg_name + ' does not exist')
-        else:
-            raise ValueError('dependency ' + dep_name + ' for package ' + pkg_name + ' does not exist')
+        return self.dep[pkg_name][dep_name]
 
     def internal_package(self, pkg_name):
         """
@@ -269,12 +321,16 @@ class PkgDep:
         return pkg_name in self.pkg
 
     def internal_dependency(self, pkg_name, dep_name):
-        found = False
-        for p_name, p_version in self.get_provider_list(pkg_name, dep_name):
-            if self.internal_package(p_name):
-                found = True
-                break
-        return found
+        """
+        Check whether a dependency is internal, i.e. at least one of its providers is a package.
+        :param pkg_name: package name
+        :type pkg_name: str
+        :param dep_name: dependency name
+        :type dep_name: str
+        :return: True if the dependency is internal, False otherwise
+        :rtype: bool
+        """
+        return has_internal_provider(self.pkg, self.dep[pkg_name][dep_name])
 
     def package_count(self):
         for p in sorted(self.pkg):
@@ -282,19 +338,42 @@ class PkgDep:
         return len(self.pkg)
 
     def dependency_count(self, pkg_name):
-        if pkg_name in self.dep:
-            return len(self.dep[pkg_name])
-        else:
-            raise ValueError('package ' + pkg_name + ' does not exist')
+        return len(self.dep[pkg_name])
 
     def provider_count(self, pkg_name, dep_name):
-        if pkg_name in self.dep:
-            if dep_name in self.dep[pkg_name]:
-                return len(self.dep[pkg_name][dep_name])
-            else:
-                raise ValueError('package ' + pkg_name + ' does not exist')
-        else:
-            raise ValueError('dependency ' + dep_name + ' for package ' + pkg_name + ' does not exist')
+        return len(self.dep[pkg_name][dep_name])
+
+    def validate(self):
+        """
+        Check the consistency of the package and dependency information once all of it
+        has been added, so the getters can assume that every package with dependencies
+        is known. Dependencies of packages with no package information (e.g. 'yum info'
+        failed for them) are discarded, since they are never output.
+        :return: None
+        """
+        for pkg_name in [p for p in self.dep if p not in self.pkg]:
+            logging.warning('no information for package ' + pkg_name + ', dependencies ignored')
+            del self.dep[pkg_name]
+
+    def finalize(self):
+        """
+        Precompute derived information once all the package and dependency information
+        has been added. The set of internal dependencies for each package is computed here
+        so it doesn't have to be recomputed every time the dependencies are filtered.
+        The sorted package names (sorted_pkg_names) and dependency lists are also cached, since
+        they are used by all the output routines.
+        Provider lists are not modified after this point, so they are converted to tuples.
+        :return: None
+        """
+        self.sorted_pkg_names = tuple(sorted(self.pkg))
+        for deps in self.dep.values():
+            for dep_name in deps:
+                deps[dep_name] = tuple(deps[dep_name])
+        self._sorted_deps = {p: sorted(d) for p, d in self.dep.items()}
+        self._internal_deps = {}
+        for pkg_name, deps in self.dep.items():
+            self._internal_deps[pkg_name] = {d for d, providers in deps.items()
+                                             if has_internal_provider(self.pkg, providers)}
 
     def print_packages_and_dependencies(self):
         """
@@ -317,6 +396,17 @@ class PkgDep:
                     print(' ' * 4 + '[' + p_name + ', ' + p_version + ']' + flag)
 
 
+def debug_enabled():
+    """
+    Check whether debug messages are enabled.
+    The parsers call this once per file instead of calling logging.debug for every line,
+    which is much more expensive when debugging is disabled (the usual case).
+    :return: True if debug messages are enabled, False otherwise
+    :rtype: bool
+    """
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
 def split_info_line(line):
     """
     Split package info line into (meaningful) words.
@@ -329,9 +419,9 @@ def split_info_line(line):
     :return: tuple with the keyword and value. (None, None) otherwise.
     :rtype: tuple
     """
-    words = line.split(':')
+    words = line.split(':', 2)
     key = words[0].strip()
-    if key in KEY_INFO_LIST:
+    if key in KEY_INFO_SET:
         return key, words[1].strip()
     else:
         return None, None
@@ -350,14 +440,14 @@ def split_dep_line(line):
     :return: tuple with relevant information. (None, None, None) otherwise.
     :rtype: tuple
     """
-    words = line.split()
-    key = words[0].strip()
+    words = line.split(None, 3)
+    key = words[0]
     if key == KEY_PACKAGE:
-        return key, words[1].strip(), words[2].strip()
+        return key, words[1], words[2]
     elif key == KEY_DEPENDENCY:
-        return key, words[1].strip(), None
+        return key, words[1], None
     elif key == KEY_PROVIDER:
-        return key, words[1].strip(), words[2].strip()
+        return key, words[1], words[2]
     else:
         return None, None, None
 
@@ -367,7 +457,8 @@ def parse_info_file(f, dep):
     Parse a file containing package information.
     This file is generated by another program that runs 'yum info' over a list of packages.
     The package information is scattered in several lines. This function assumes that the
-    package name will always come first.
+    package name will always come first. The values found for the current package are kept
+    in a dictionary indexed by keyword until the next package name is found.
     :param f: info file
     :type f: file
     :param dep: package/dependency object
@@ -376,90 +467,102 @@ def parse_info_file(f, dep):
     :rtype: PkgDep
     """
 
-    # Initialize values. Only the package name needs to be initialized at this
-    # point, but initializing all variables keeps PyCharm happy :)
-    pkg_name = UNDEFINED
-    pkg_arch = UNDEFINED
-    pkg_version = UNDEFINED
-    pkg_release = UNDEFINED
-    pkg_repository = UNDEFINED
-    pkg_summary = UNDEFINED
+    def add_package(info):
+        dep.add_package(info[KEY_NAME] + '.' + info[KEY_ARCH], info[KEY_ARCH], info[KEY_VERSION],
+                        info[KEY_RELEASE], info[KEY_REPOSITORY], info[KEY_SUMMARY])
+
+    # The package name will be UNDEFINED until the first package is found
+    pkg_info = dict.fromkeys(KEY_INFO_LIST, UNDEFINED)
+
+    debug = debug_enabled()
 
-    for line in f:
+    for line in f.read().splitlines():
 
         key, name = split_info_line(line)
-        # print key, name
 
         if key == KEY_NAME:
-            logging.debug('found package ' + name)
+            if debug:
+                logging.debug('found package %s', name)
 
-            # Add "previous" package information.
-            # The package name will be UNDEFINED the first time.
-            if pkg_name != UNDEFINED:
-                dep.add_package(pkg_name + '.' + pkg_arch, pkg_arch, pkg_version,
-                                pkg_release, pkg_repository, pkg_summary)
-            pkg_name = name
+            # Add "previous" package information and reset values
+            if pkg_info[KEY_NAME] != UNDEFINED:
+                add_package(pkg_info)
+            pkg_info = dict.fromkeys(KEY_INFO_LIST, UNDEFINED)
+            pkg_info[KEY_NAME] = name
 
-            # Reset values
-            pkg_arch = UNDEFINED
-            pkg_version = UNDEFINED
-            pkg_release = UNDEFINED
-            pkg_repository = UNDEFINED
-            pkg_summary = UNDEFINED
-
-        elif key == KEY_VERSION:
-            logging.debug('  found version ' + name)
-            pkg_version = name
-        elif key == KEY_RELEASE:
-            logging.debug('  found release ' + name)
-            pkg_release = name
-        elif key == KEY_ARCH:
-            logging.debug('  found arch ' + name)
-            pkg_arch = name
-        elif key == KEY_REPOSITORY:
-            logging.debug('  found repo ' + name)
-            pkg_repository = name
-        elif key == KEY_SUMMARY:
-            logging.debug('  found summary ' + name)
-            pkg_summary = name
+        elif key is not None:
+            if debug:
+                logging.debug('  found %s %s', key.lower(), name)
+            pkg_info[key] = name
 
     # Output the last package
-    dep.add_package(pkg_name + '.' + pkg_arch, pkg_arch, pkg_version,
-                    pkg_release, pkg_repository, pkg_summary)
+    add_package(pkg_info)
 
     return dep
 
 
-def parse_dep_file(f, dep):
+def read_dep_lines(lines):
     """
-    Parse dependency file for package, dependency or provider definitions.
-    This file is generated by another program that runs 'yum deplist' over a list of packages.
+    Read package, dependency and provider definitions from the lines of a dependency file.
+    This is the part of the dependency file parsing shared by parse_dep_file and
+    output_csv_streaming. It yields a five element tuple for each definition found:
+    - Package line: keyword (KEY_PACKAGE), package name, None, None and None.
+    - Dependency line: keyword (KEY_DEPENDENCY), package name, dependency name, None and None.
+    - Provider line: keyword (KEY_PROVIDER), package name, dependency name, provider name
+      and provider version.
     This function assumes that the package name will always come first.
-    :param f: dependency file
-    :type f: file
-    :param dep: package/dependency object
-    :type dep: PkgDep
-    :return: updated package/dependency object
-    :rtype: PkgDep
+    :param lines: dependency file lines
+    :type lines: iterable
+    :raise ValueError: if a provider is found before any dependency of a package
+    :return: generator of tuples
+    :rtype: generator
     """
     pkg_name = UNDEFINED
-    dep_name = UNDEFINED
+    dep_name = None
 
-    for line in f:
+    debug = debug_enabled()
+
+    for line in lines:
 
         key, name, version = split_dep_line(line)
 
         if key == KEY_PACKAGE:
-            logging.debug('found package ' + name + ' ' + name)
-            # dep.add_package(name, name)
+            if debug:
+                logging.debug('found package %s %s', name, version)
             pkg_name = name
+            dep_name = None
+            yield key, pkg_name, None, None, None
         elif key == KEY_DEPENDENCY:
-            logging.debug('  found dependency ' + name)
-            dep.add_dependency(pkg_name, name)
+            if debug:
+                logging.debug('  found dependency %s', name)
             dep_name = name
+            yield key, pkg_name, dep_name, None, None
         elif key == KEY_PROVIDER:
-            logging.debug('    found provider ' + pkg_name + ' ' + dep_name + ' ' + name + ' ' + version)
-            dep.add_provider(pkg_name, dep_name, name, version)
+            if debug:
+                logging.debug('    found provider %s %s %s %s', pkg_name, dep_name, name, version)
+            if dep_name is None:
+                raise ValueError('provider ' + name + ' found before any dependency for package ' + pkg_name)
+            yield key, pkg_name, dep_name, name, version
+
+
+def parse_dep_file(f, dep):
+    """
+    Parse dependency file for package, dependency or provider definitions.
+    This file is generated by another program that runs 'yum deplist' over a list of packages.
+    This function assumes that the package name will always come first.
+    :param f: dependency file
+    :type f: file
+    :param dep: package/dependency object
+    :type dep: PkgDep
+    :raise ValueError: if a provider is found before any dependency of a package
+    :return: updated package/dependency object
+    :rtype: PkgDep
+    """
+    for key, pkg_name, dep_name, p_name, p_version in read_dep_lines(f.read().splitlines()):
+        if key == KEY_DEPENDENCY:
+            dep.add_dependency_fast(pkg_name, dep_name)
+        elif key == KEY_PROVIDER:
+            dep.add_provider_fast(pkg_name, dep_name, p_name, p_version)
 
     return dep
 
@@ -481,6 +584,9 @@ def parse_files(info_file_name, dep_file_name):
         dep = parse_info_file(f_info, dep)
         dep = parse_dep_file(f_dep, dep)
 
+    dep.validate()
+    dep.finalize()
+
     return dep
 
 
@@ -498,10 +604,7 @@ def get_dep_list(dep, pkg_name, include_all):
     :return dependency list
     :rtype: list
     """
-    d_list = dep.get_dependency_list(pkg_name)
-    if not include_all:
-        d_list = [d for d in d_list if dep.internal_dependency(pkg_name, d)]
-    return d_list
+    return dep.get_effective_dependency_list(pkg_name, include_all)
 
 
 def get_provider_repository(dep, name):
@@ -517,7 +620,7 @@ def get_provider_repository(dep, name):
     """
     try:
         repository = dep.get_repository(name)
-    except ValueError:
+    except KeyError:
         repository = ''
     return repository
 
@@ -533,27 +636,72 @@ def output_text(dep, print_all):
     :type print_all: bool
     :return: None
     """
-    for pkg_name in sorted(dep.pkg):
+    write = sys.stdout.write
+    pkg_map = dep.pkg
+    dep_map = dep.dep
 
-        # Print package information
-        print('Package {} [{}] [{}] [{}] [{}] [{}]'.format(pkg_name,
-                                                           dep.get_version(pkg_name),
-                                                           dep.get_release(pkg_name),
-                                                           dep.get_arch(pkg_name),
-                                                           dep.get_repository(pkg_name),
-                                                           dep.get_summary(pkg_name)))
+    for pkg_name in dep.sorted_pkg_names:
+        pkg_info = pkg_map[pkg_name]
+
+        # Package information
+        out = [f'Package {pkg_name} [{pkg_info.version}] [{pkg_info.release}] [{pkg_info.arch}] '
+               f'[{pkg_info.repository}] [{pkg_info.summary}]']
+
+        # Dependency and provider information, if any
+        pkg_deps = dep_map[pkg_name]
+        for dep_name in get_dep_list(dep, pkg_name, print_all):
+            out.append(f'  {dep_name}')
+            for p_name, p_version in pkg_deps[dep_name]:
+                flag = ' ' + INTERNAL if p_name in pkg_map else ''
+                out.append(f'    [{p_name}, {p_version}]{flag}')
+
+        write('\n'.join(out) + '\n')
 
-        # Get (effective) dependency list for the current package
-        dep_list = get_dep_list(dep, pkg_name, print_all)
-        if len(dep_list) == 0:
-            continue
 
-        # Print all dependency and provider information
-        for dep_name in dep_list:
-            print(' ' * 2 + dep_name)
-            for p_name, p_version in dep.get_provider_list(pkg_name, dep_name):
-                flag = ' ' + INTERNAL if dep.internal_package(p_name) else ''
-                print(' ' * 4 + '[' + p_name + ', ' + p_version + ']' + flag)
+def get_csv_lines(pkg_map, pkg_name, pkg_deps, dep_list):
+    """
+    Return the csv output lines for a package, one line per dependency provider.
+    A single line with no dependency information is returned if the dependency list is empty.
+    The list will be empty if none of the dependencies have providers.
+    Provided to prevent code duplication.
+    :param pkg_map: package information dictionary (PkgDep.pkg)
+    :type pkg_map: dict
+    :param pkg_name: package name
+    :type pkg_name: str
+    :param pkg_deps: package dependencies, indexed by dependency name
+    :type pkg_deps: dict
+    :param dep_list: (effective) dependency list for the package
+    :type dep_list: list
+    :return: output lines
+    :rtype: list
+    """
+    pkg_info = pkg_map[pkg_name]
+    line_head = (f'{pkg_name},{pkg_info.version},{pkg_info.release},'
+                 f'{pkg_info.arch},{pkg_info.repository}')
+
+    pkg_summary = pkg_info.summary.replace(',', ' ')
+
+    # Default output for a package with no dependencies.
+    out = []
+    if len(dep_list) == 0:
+        out.append(f'{line_head},--,--,--,--,--,--,{pkg_summary}')
+
+    # Dependency and provider information.
+    # The line prefix is the same for all the providers of a dependency.
+    for dep_name in dep_list:
+        dep_head = f'{line_head},{dep_name}'
+        for p_name, p_version in pkg_deps[dep_name]:
+            p_info = pkg_map.get(p_name)
+            if p_info is not None:
+                p_repository = p_info.repository
+                p_arch = p_info.arch
+                p_flag = 'yes'
+            else:
+                p_repository = ''
+                p_arch = ''
+                p_flag = 'no'
+            out.append(f'{dep_head},{p_name},{p_version},{p_arch},{p_repository},{p_flag},{pkg_summary}')
+    return out
 
 
 def output_csv(dep, print_all):
@@ -568,42 +716,85 @@ def output_csv(dep, print_all):
     """
 
     # Header
-    print(
-        'Package,Version,Release,Architecture,Repository,Dependency,Provider,Version,Architecture,Repository,Internal,Summary')
-
-    for pkg_name in sorted(dep.pkg):
-        line_head = '{},{},{},{},{}'.format(pkg_name,
-                                            dep.get_version(pkg_name),
-                                            dep.get_release(pkg_name),
-                                            dep.get_arch(pkg_name),
-                                            dep.get_repository(pkg_name))
+    print(CSV_HEADER)
 
-        pkg_summary = dep.get_summary(pkg_name).replace(',', ' ')
+    write = sys.stdout.write
+    pkg_map = dep.pkg
+    dep_map = dep.dep
 
+    for pkg_name in dep.sorted_pkg_names:
         # Get the (effective) dependency list for the current package
+        # There are no lines if none of the dependencies have providers (unsatisfied dependencies)
         dep_list = get_dep_list(dep, pkg_name, print_all)
-        if len(dep_list) == 0:
-            output_line = line_head + ',--,--,--,--,--,--' + ',' + pkg_summary
-            print(output_line)
-            continue
-
-        # Print dependency and provider information
-        for dep_name in dep_list:
-            # output_line = line_head + ',' + dep_name
-            for p_name, p_version in dep.get_provider_list(pkg_name, dep_name):
-                try:
-                    p_repository = dep.get_repository(p_name)
-                    p_arch = dep.get_arch(p_name)
-                    p_flag = 'yes'
-                except ValueError:
-                    p_repository = ''
-                    p_arch = ''
-                    p_flag = 'no'
-                # flag = 'yes' if dep.internal_package(p_name) else 'no'
-                output_line = line_head + ',' + dep_name + \
-                              ',' + p_name + ',' + p_version + ',' + p_arch + ',' + p_repository + ',' + p_flag + \
-                              ',' + pkg_summary
-                print(output_line)
+        out = get_csv_lines(pkg_map, pkg_name, dep_map[pkg_name], dep_list)
+        if out:
+            write('\n'.join(out) + '\n')
+
+
+def output_csv_streaming(info_file_name, dep_file_name, print_all):
+    """
+    Print package dependencies in plain csv format, one dependency per line, while the
+    dependency file is being read. Only the package information is kept in memory; the
+    dependencies are printed as soon as all the dependencies for a package are read.
+    Packages are printed in the order they appear in the dependency file, followed by
+    the packages with no dependency information. Unlike parse_files, repeated package
+    entries in the dependency file are not merged; only the first entry is printed.
+    :param info_file_name: package information file name
+    :type info_file_name: str
+    :param dep_file_name: package dependency file name
+    :type dep_file_name: str
+    :param print_all: output all dependencies
+    :type print_all: bool
+    :return: None
+    """
+    dep = PkgDep()
+    with open(info_file_name, 'r') as f_info:
+        dep = parse_info_file(f_info, dep)
+    dep.finalize()
+
+    # Header
+    print(CSV_HEADER)
+
+    write = sys.stdout.write
+    pkg_map = dep.pkg
+    printed = set()
+
+    def output_package(name, deps):
+        # Dependencies of packages with no package information are never printed
+        if name not in pkg_map:
+            return
+        if name in printed:
+            if deps:
+                logging.warning('package ' + name + ' repeated in dependency file, ignored')
+            return
+        dep_list = sorted(deps)
+        if not print_all:
+            dep_list = [d for d in dep_list if has_internal_provider(pkg_map, deps[d])]
+        out = get_csv_lines(pkg_map, name, deps, dep_list)
+        if out:
+            write('\n'.join(out) + '\n')
+        printed.add(name)
+
+    last_pkg_name = UNDEFINED
+    pkg_deps = {}
+
+    with open(dep_file_name, 'r') as f_dep:
+        for key, pkg_name, dep_name, p_name, p_version in read_dep_lines(f_dep):
+            if key == KEY_PACKAGE:
+                output_package(last_pkg_name, pkg_deps)
+                last_pkg_name = pkg_name
+                pkg_deps = {}
+            elif key == KEY_DEPENDENCY:
+                pkg_deps.setdefault(dep_name, [])
+            elif key == KEY_PROVIDER:
+                pkg_deps[dep_name].append((p_name, p_version))
+
+    # Output the last package
+    output_package(last_pkg_name, pkg_deps)
+
+    # Packages with no dependency information
+    for pkg_name in dep.sorted_pkg_names:
+        output_package(pkg_name, {})
 
 
 def output_wiki(dep, print_all):
@@ -621,60 +812,58 @@ def output_wiki(dep, print_all):
     print('! # || Package || Version|| Repository || Dependency || Provider || Version || Repository')
     print('|-')
 
-    # Compute the number of rows per package.
-    # This information is needed before printing the output.
-    row_span = {}
-    for pkg_name in sorted(dep.pkg):
-        row_span[pkg_name] = 0
-        dep_list = get_dep_list(dep, pkg_name, print_all)
-        for dep_name in dep_list:
-            row_span[pkg_name] += dep.provider_count(pkg_name, dep_name)
-        row_span[pkg_name] = max(row_span[pkg_name], 1)
+    write = sys.stdout.write
+    pkg_map = dep.pkg
+    dep_map = dep.dep
 
     pkg_count = 1
-    for pkg_name in sorted(dep.pkg):
+    for pkg_name in dep.sorted_pkg_names:
+        pkg_info = pkg_map[pkg_name]
+
+        # Get the (effective) dependency list for the current package.
+        # The number of rows for the package is the total number of providers
+        # and it's needed before printing the package information.
+        dep_list = get_dep_list(dep, pkg_name, print_all)
+        pkg_deps = dep_map[pkg_name]
+        provider_counts = [len(pkg_deps[dep_name]) for dep_name in dep_list]
+        row_span = max(sum(provider_counts), 1)
 
         # Print package name and architecture.
         # The row span should be the same for both.
         # The anchor to the package entry is included at this point.
-        print('| rowspan="' + str(row_span[pkg_name]) + '" | ' + str(pkg_count))
-        print('| rowspan="' + str(row_span[pkg_name]) + '" | ' + '<span id="' + pkg_name + '">' + pkg_name + '</span>')
-        print('| rowspan="' + str(row_span[pkg_name]) + '" | ' + dep.get_version(pkg_name))
-        print('| rowspan="' + str(row_span[pkg_name]) + '" | ' + dep.get_repository(pkg_name))
+        out = [f'| rowspan="{row_span}" | {pkg_count}',
+               f'| rowspan="{row_span}" | <span id="{pkg_name}">{pkg_name}</span>',
+               f'| rowspan="{row_span}" | {pkg_info.version}',
+               f'| rowspan="{row_span}" | {pkg_info.repository}']
         pkg_count += 1
 
-        # Get the (effective) dependency list for the current package.
         # Print default output for a package with no dependencies.
-        dep_list = get_dep_list(dep, pkg_name, print_all)
-        len_dep_list = len(dep_list)
-        if len_dep_list == 0:
-            print('| ---')
-            print('| ---')
-            print('| ---')
-            print('| ---')
-            print('|-')
-            continue
+        if len(dep_list) == 0:
+            out.extend(['| ---', '| ---', '| ---', '| ---', '|-'])
 
         # Loop over all the dependencies.
         # The row span for each dependency will be the number of providers.
         # Print the provider name, version and repository.
         # Non-internal providers won't have a repository (and all other properties).
-        for dep_name in dep_list:
-            print('| rowspan="' + str(dep.provider_count(pkg_name, dep_name)) + '" | ' + dep_name)
-            for p_name, p_version in dep.get_provider_list(pkg_name, dep_name):
-                try:
-                    p_repository = dep.get_repository(p_name)
-                except ValueError:
+        for dep_name, provider_count in zip(dep_list, provider_counts):
+            out.append(f'| rowspan="{provider_count}" | {dep_name}')
+            for p_name, p_version in pkg_deps[dep_name]:
+                p_info = pkg_map.get(p_name)
+                if p_info is not None:
+                    p_repository = p_info.repository
+                    p_name = f'[[#{p_name}|{p_name}]]'
+                else:
                     p_repository = ''
-                if dep.internal_package(p_name):
-                    p_name = '[[#' + p_name + '|' + p_name + ']]'
-                print('| ' + p_name)
-                print('| ' + p_version)
-                print('| ' + p_repository)
-                print('|-')
+                out.extend([f'| {p_name}', f'| {p_version}', f'| {p_repository}', '|-'])
+
+        write('\n'.join(out) + '\n')
     print('|}')
 
 
+# Output routine for each output option
+OUTPUT_DISPATCH = {OUT_TEXT: output_text, OUT_CSV: output_csv, OUT_WIKI: output_wiki}
+
+
 def get_args(argv):
     parser = ArgumentParser(epilog='')
 
@@ -687,7 +876,7 @@ def get_args(argv):
     parser.add_argument('-o', '--output-format',
                         action='store',
                         dest='output',
-                        choices=[OUT_TEXT, OUT_CSV, OUT_WIKI],
+                        choices=list(OUTPUT_DISPATCH),
                         default=OUT_TEXT,
                         help='Output format default=(' + OUT_TEXT + ')')
 
@@ -697,7 +886,19 @@ def get_args(argv):
                         default=False,
                         help='Print all dependencies (default=False)')
 
-    return parser.parse_args(argv[1:])
+    parser.add_argument('-s', '--stream',
+                        action='store_true',
+                        dest='stream',
+                        default=False,
+                        help='Print csv output while reading the dependency file, '
+                             'in dependency file order; repeated packages in the dependency '
+                             'file are not merged, only the first one is printed (default=False)')
+
+    args = parser.parse_args(argv[1:])
+    if args.stream and args.output != OUT_CSV:
+        parser.error('--stream can only be used with ' + OUT_CSV + ' output')
+
+    return args
 
 
 if __name__ == '__main__':
@@ -707,13 +908,10 @@ if __name__ == '__main__':
 
     logging.basicConfig(level=logging.ERROR)
 
-    p_dep = parse_files(args.input + '.info', args.input + '.dep')
-
-    if args.output == OUT_TEXT:
-        output_text(p_dep, args.all)
-    elif args.output == OUT_CSV:
-        output_csv(p_dep, args.all)
-    elif args.output == OUT_WIKI:
-        output_wiki(p_dep, args.all)
+    if args.stream:
+        output_csv_streaming(args.input + '.info', args.input + '.dep', args.all)
     else:
-        raise ValueError('Unknown output option')
+        p_dep = parse_files(args.input + '.info', args.input + '.dep')
+
+        # The output option was already validated by the argument parser
+        OUTPUT_DISPATCH[args.output](p_dep, args.all)